@@ -1,5 +1,6 @@
+import sys
 import time
-from collections import deque, Counter
+from collections import deque
 
 # --- Constants ---
 WPM_IDEAL_MIN = 140
@@ -7,16 +8,84 @@ WPM_IDEAL_MAX = 160
 PAUSE_THRESHOLD_SECONDS = 2.0
 WPM_CALCULATION_MIN_DURATION_SECONDS = 1.5
 REPETITION_PHRASE_LENGTH = 3
+PHRASE_KEY_SEPARATOR = "\0"  # Joins phrase words into a single dictionary key
 CONFIDENCE_THRESHOLD = 0.80  # Words with confidence below this will be ignored
+WORD_CACHE_MAX_SIZE = 4096  # Distinct raw words remembered by canonical_word()
 
-# Expanded list of single-word fillers for more accurate detection,
-# as multi-word phrase detection is not supported by the current logic.
-FILLER_WORDS = {
+# Expanded list of single-word fillers for more accurate detection.
+# Entries are interned to match the words produced by canonical_word().
+FILLER_WORDS = frozenset(map(sys.intern, (
     "uh", "um", "er", "ah", "hmm", "so", "well", "right", "literally", "okay",
     "anyway", "see", "just", "really", "like", "actually", "basically", "mean",
     "guess", "suppose", "think", "honest", "totally", "simply", "personally",
     "seriously", "truly", "virtually", "apparently"
-}
+)))
+
+# Multi-word fillers. Phrases ending in a word from FILLER_WORDS (e.g. "i mean")
+# are already covered, as a filler is counted once per word it ends on.
+FILLER_PHRASES = ("you know", "kind of", "sort of", "or something")
+
+def _build_filler_trie():
+    """
+    Builds a trie over every filler, keyed from the last word backwards, so
+    fillers can be matched by looking back from the word that ends them.
+    """
+    trie = {}
+    for filler in list(FILLER_WORDS) + list(FILLER_PHRASES):
+        node = trie
+        for word in reversed(filler.split()):
+            node = node.setdefault(sys.intern(word), {})
+        node[None] = True # Marks the end of a filler
+    return trie
+
+FILLER_TRIE = _build_filler_trie()
+
+# Maps raw recognizer words to their interned lowercase form
+_canonical_words = {}
+
+def canonical_word(word):
+    """
+    Returns the lowercase, interned form of `word`. Repeated words then share
+    one string object, so set and dict lookups on them hit the identity fast
+    path instead of comparing characters. Results are cached up to
+    WORD_CACHE_MAX_SIZE distinct words.
+    """
+    canonical = _canonical_words.get(word)
+    if canonical is None:
+        canonical = sys.intern(word.lower())
+        if len(_canonical_words) < WORD_CACHE_MAX_SIZE:
+            _canonical_words[word] = canonical
+    return canonical
+
+def filler_ends_at(words, end):
+    """
+    Returns True if a filler word or phrase ends at `words[end]`. Words that
+    cannot end a filler are rejected by a single dict lookup, however large
+    the filler vocabulary is.
+    """
+    node = FILLER_TRIE.get(words[end])
+    while node is not None:
+        if None in node:
+            return True
+        end -= 1
+        if end < 0:
+            return False
+        node = node.get(words[end])
+    return False
+
+def count_fillers(words, start=0):
+    """Counts the fillers in `words` that end at or after index `start`."""
+    return sum(1 for end in range(start, len(words)) if filler_ends_at(words, end))
+
+def iter_phrases(words, start=0):
+    """
+    Yields every REPETITION_PHRASE_LENGTH-word phrase in `words` that starts at
+    or after `start`. Zipping offset slices builds the n-grams in C instead of
+    slicing the list once per phrase. Phrases are joined into string keys
+    because strings cache their hash, unlike tuples.
+    """
+    ngrams = zip(*(words[start + offset:] for offset in range(REPETITION_PHRASE_LENGTH)))
+    return map(PHRASE_KEY_SEPARATOR.join, ngrams)
 
 class PaceAnalyzer:
     """
@@ -27,7 +96,10 @@ class PaceAnalyzer:
     def __init__(self, window_size_seconds=10):
         self.window_size = window_size_seconds
         
+        # One (timestamp, cumulative_word_count) entry per word-arrival event,
+        # so a partial adding several words only costs a single entry.
         self.word_timestamps = deque()
+        self.window_base_count = 0  # Cumulative word count just before the oldest entry
         
         # Session-wide statistics, updated only from final results
         self.session_total_words = 0
@@ -35,7 +107,7 @@ class PaceAnalyzer:
         self.session_total_confidence = 0.0
         self.session_words_with_confidence = 0
         self.session_repetitive_phrases = 0
-        self.phrase_counts = Counter()
+        self.phrase_counts = {}  # Phrase key -> times spoken, only for phrases seen at least once
 
         # Live data for the current, unconfirmed utterance
         self.live_words = []
@@ -47,8 +119,32 @@ class PaceAnalyzer:
 
     def _cleanup(self, current_time):
         """Removes word timestamps older than the analysis window."""
-        while self.word_timestamps and (current_time - self.word_timestamps[0] > self.window_size):
-            self.word_timestamps.popleft()
+        while self.word_timestamps and (current_time - self.word_timestamps[0][0] > self.window_size):
+            _, self.window_base_count = self.word_timestamps.popleft()
+
+    def _cumulative_word_count(self):
+        """Returns the cumulative word count at the newest timestamp entry."""
+        return self.word_timestamps[-1][1] if self.word_timestamps else self.window_base_count
+
+    def _add_words(self, timestamp, count):
+        """Records `count` words arriving at `timestamp` as a single entry."""
+        self.word_timestamps.append((timestamp, self._cumulative_word_count() + count))
+
+    def _add_word_timestamps(self, timestamps):
+        """Records one word at each of `timestamps` with a single deque extend."""
+        first_total = self._cumulative_word_count() + 1
+        self.word_timestamps.extend(zip(timestamps, range(first_total, first_total + len(timestamps))))
+
+    def _remove_words(self, count):
+        """Takes back the `count` most recently added words."""
+        while count > 0 and self.word_timestamps:
+            timestamp, total = self.word_timestamps[-1]
+            previous_total = self.word_timestamps[-2][1] if len(self.word_timestamps) > 1 else self.window_base_count
+            if total - previous_total > count:
+                self.word_timestamps[-1] = (timestamp, total - count)
+                return
+            self.word_timestamps.pop()
+            count -= total - previous_total
 
     def process_final_result(self, word_list):
         """
@@ -61,29 +157,37 @@ class PaceAnalyzer:
         # The live utterance is now complete. Reset live data.
         self.live_words, self.live_filler_count, self.live_repetitive_phrase_count, self.last_partial_text = [], 0, 0, ""
         
-        # Filter words by confidence before processing
-        confirmed_words = [d for d in word_list if d.get('conf', 0) >= CONFIDENCE_THRESHOLD]
-        
-        final_words = [d.get('word', '').lower() for d in confirmed_words if d.get('word')]
+        # Filter words by confidence and gather their stats in a single pass
+        final_words = []
+        filler_count = 0
+        total_confidence = 0.0
+        word_starts = []
+        for word_data in word_list:
+            confidence = word_data.get('conf', 0)
+            if confidence < CONFIDENCE_THRESHOLD:
+                continue
+            total_confidence += confidence
+            word_starts.append(word_data.get('start', current_time))
+
+            word = word_data.get('word')
+            if word:
+                word = canonical_word(word)
+                final_words.append(word)
+                if filler_ends_at(final_words, len(final_words) - 1):
+                    filler_count += 1
         
         # Update session totals from the final, accurate words
         self.session_total_words += len(final_words)
-        self.session_filler_words += sum(1 for word in final_words if word in FILLER_WORDS)
+        self.session_filler_words += filler_count
+        self.session_total_confidence += total_confidence
+        self.session_words_with_confidence += len(word_starts)
+        self._add_word_timestamps(word_starts)
         
-        if len(final_words) >= REPETITION_PHRASE_LENGTH:
-            for i in range(len(final_words) - REPETITION_PHRASE_LENGTH + 1):
-                phrase = tuple(final_words[i:i + REPETITION_PHRASE_LENGTH])
-                if self.phrase_counts[phrase] > 0:
-                    self.session_repetitive_phrases += 1
-                self.phrase_counts[phrase] += 1
-
-        for word_data in confirmed_words:
-            confidence = word_data.get('conf')
-            if confidence is not None:
-                self.session_total_confidence += confidence
-                self.session_words_with_confidence += 1
-            
-            self.word_timestamps.append(word_data.get('start', current_time))
+        for phrase in iter_phrases(final_words):
+            count = self.phrase_counts.get(phrase, 0)
+            if count > 0:
+                self.session_repetitive_phrases += 1
+            self.phrase_counts[phrase] = count + 1
 
     def process_partial_result(self, partial_text):
         """
@@ -95,25 +199,36 @@ class PaceAnalyzer:
 
         self.last_word_time = current_time
         self.last_partial_text = partial_text
-        new_words = partial_text.lower().split()
+        new_words = [canonical_word(word) for word in partial_text.split()]
         
         diff = len(new_words) - len(self.live_words)
         if diff > 0:
-            for _ in range(diff): self.word_timestamps.append(current_time)
+            self._add_words(current_time, diff)
         elif diff < 0:
-            for _ in range(abs(diff)):
-                if self.word_timestamps: self.word_timestamps.pop()
+            self._remove_words(-diff)
         
+        # Partials usually only revise the tail of the utterance, so find the
+        # common prefix and only rescan what changed after it.
+        old_words = self.live_words
+        k = 0
+        limit = min(len(old_words), len(new_words))
+        while k < limit and old_words[k] == new_words[k]:
+            k += 1
+
+        # A filler is counted at its last word, so only those ending in the tail can change.
+        self.live_filler_count += count_fillers(new_words, k)
+        self.live_filler_count -= count_fillers(old_words, k)
+
+        # Only phrases overlapping the changed tail can differ between the two versions.
+        first_phrase = max(0, k - REPETITION_PHRASE_LENGTH + 1)
+        self.live_repetitive_phrase_count += self._count_known_phrases(new_words, first_phrase)
+        self.live_repetitive_phrase_count -= self._count_known_phrases(old_words, first_phrase)
+
         self.live_words = new_words
-        
-        self.live_filler_count = sum(1 for word in self.live_words if word in FILLER_WORDS)
-        
-        self.live_repetitive_phrase_count = 0
-        if len(self.live_words) >= REPETITION_PHRASE_LENGTH:
-            for i in range(len(self.live_words) - REPETITION_PHRASE_LENGTH + 1):
-                phrase = tuple(self.live_words[i:i + REPETITION_PHRASE_LENGTH])
-                if self.phrase_counts[phrase] > 0:
-                    self.live_repetitive_phrase_count += 1
+
+    def _count_known_phrases(self, words, start):
+        """Counts phrases starting at or after `start` that were already spoken this session."""
+        return sum(1 for phrase in iter_phrases(words, start) if phrase in self.phrase_counts)
 
     def get_analysis(self, current_time):
         """
@@ -124,18 +239,21 @@ class PaceAnalyzer:
         # On a pause, only reset the WPM calculator, not the live word counts.
         if self.last_word_time > 0 and current_time - self.last_word_time > PAUSE_THRESHOLD_SECONDS:
             self.word_timestamps.clear()
+            self.window_base_count = 0
             self.last_word_time = 0
 
-        word_count_in_window = len(self.word_timestamps)
+        word_count_in_window = self._cumulative_word_count() - self.window_base_count
         raw_wpm = 0
         if word_count_in_window > 2:
-            duration = current_time - self.word_timestamps[0]
+            duration = current_time - self.word_timestamps[0][0]
             if duration >= WPM_CALCULATION_MIN_DURATION_SECONDS:
                 raw_wpm = (word_count_in_window / duration) * 60
         
-        smoothing_factor = 0.3 if raw_wpm > 0 else 0.5
-        self.smoothed_wpm = (smoothing_factor * raw_wpm) + ((1 - smoothing_factor) * self.smoothed_wpm)
-        if self.smoothed_wpm < 5: self.smoothed_wpm = 0
+        # While idle the smoothed WPM is already settled at zero
+        if raw_wpm > 0 or self.smoothed_wpm > 0:
+            smoothing_factor = 0.3 if raw_wpm > 0 else 0.5
+            self.smoothed_wpm = (smoothing_factor * raw_wpm) + ((1 - smoothing_factor) * self.smoothed_wpm)
+            if self.smoothed_wpm < 5: self.smoothed_wpm = 0
         
         clarity = (self.session_total_confidence / self.session_words_with_confidence) if self.session_words_with_confidence > 0 else 1.0
             
@@ -1,12 +1,13 @@
 import cv2
-import json
 import numpy as np
+import orjson
 import pyaudio
 import queue
 import threading
 import time
 import os
 import textwrap
+from dataclasses import dataclass, field
 from Pacing_info import PaceAnalyzer, CONFIDENCE_THRESHOLD
 from model_refiner import ModelManager, MODEL_PATH
 
@@ -17,7 +18,9 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 
 # Audio
 SAMPLE_RATE = 16000
-CHUNK_SIZE = 8192
+CHUNK_SIZE = 8192 # Frames per stream buffer and per read (0.5 seconds at 16 kHz)
+AUDIO_BUFFER_SIZE = 1 << 20 # 1 MiB, about 32 seconds of 16-bit mono audio
+AUDIO_READ_TIMEOUT = 0.1 # Seconds the recognizer waits for new audio
 
 # Video & UI
 WINDOW_WIDTH = 960
@@ -26,6 +29,12 @@ UI_FONT = cv2.FONT_HERSHEY_SIMPLEX
 UI_FONT_COLOR = (255, 255, 255)
 UI_BG_COLOR = (0, 0, 0)
 UI_PANEL_ALPHA = 0.6
+UI_PANEL_RECT = (10, 10, 340, 160) # x1, y1, x2, y2 of the stats panel (inclusive)
+
+# The panel background never changes, so it is built once and reused as the
+# base of every rendered panel.
+UI_PANEL = np.full((UI_PANEL_RECT[3] - UI_PANEL_RECT[1] + 1, UI_PANEL_RECT[2] - UI_PANEL_RECT[0] + 1, 3),
+                   UI_BG_COLOR, dtype=np.uint8)
 
 # --- Helper Functions ---
 
@@ -37,29 +46,175 @@ def draw_text_with_outline(frame, text, pos, scale=0.8, color=(255, 255, 255), t
     # Draw the main text
     cv2.putText(frame, text, (x, y), UI_FONT, scale, color, thickness, cv2.LINE_AA)
 
-def draw_ui(frame, stats):
-    """Draws the main statistics panel on the frame."""
-    # Create a semi-transparent background for the panel
-    overlay = frame.copy()
-    cv2.rectangle(overlay, (10, 10), (340, 160), UI_BG_COLOR, -1)
-    frame = cv2.addWeighted(overlay, UI_PANEL_ALPHA, frame, 1 - UI_PANEL_ALPHA, 0)
-
-    # Display stats
+def format_stats(stats):
+    """Builds the (text, position, scale) lines shown on the statistics panel."""
     wpm_text = f"WPM: {stats.get('wpm', 0)}"
     pace_text = f"Pace: {stats.get('pacing_feedback', '...')}"
     clarity_text = f"Clarity: {stats.get('clarity_score', 100):.0f}%"
     words_text = f"Total Words: {stats.get('total_words', 0)}"
     fillers_text = f"Filler Words: {stats.get('filler_words', 0)}"
 
-    draw_text_with_outline(frame, wpm_text, (20, 45))
-    draw_text_with_outline(frame, pace_text, (20, 75))
-    draw_text_with_outline(frame, clarity_text, (20, 105))
-    draw_text_with_outline(frame, f"{words_text} | {fillers_text}", (20, 135), scale=0.7)
-    return frame
+    return [
+        (wpm_text, (20, 45), 0.8),
+        (pace_text, (20, 75), 0.8),
+        (clarity_text, (20, 105), 0.8),
+        (f"{words_text} | {fillers_text}", (20, 135), 0.7),
+    ]
+
+class UIRenderer:
+    """
+    Draws the statistics panel. The panel, text included, is only rendered
+    when the stats change; every frame then just blends the cached panel onto
+    the camera image.
+    """
+    def __init__(self):
+        self.panel_origin = (0, 0)
+        self._cached_panel = None
+        self._panel_weights = None
+        self._frame_weights = None
+        self.update_stats({})
+
+    def update_stats(self, stats):
+        """Re-renders the cached panel for a new set of stats."""
+        stat_lines = format_stats(stats)
+
+        # Long lines may run past the background, so cover their full extent too
+        x1, y1, x2, y2 = UI_PANEL_RECT
+        left, top, right, bottom = x1, y1, x2 + 1, y2 + 1
+        for text, (x, y), scale in stat_lines:
+            (width, height), baseline = cv2.getTextSize(text, UI_FONT, scale, 2)
+            left, top = min(left, max(0, x - 2)), min(top, max(0, y - height - 2))
+            right, bottom = max(right, x + width + 2), max(bottom, y + baseline + 2)
+        self.panel_origin = (left, top)
+
+        # Render the text as it will look over the translucent background
+        shape = (bottom - top, right - left)
+        panel = np.zeros(shape + (3,), dtype=np.uint8)
+        background_alpha = np.zeros(shape, dtype=np.float32)
+        background = (slice(y1 - top, y2 + 1 - top), slice(x1 - left, x2 + 1 - left))
+        panel[background] = UI_PANEL * UI_PANEL_ALPHA
+        background_alpha[background] = UI_PANEL_ALPHA
+        # How much of the camera image shows through each pixel; text hides it
+        transmission = np.full(shape, 255, dtype=np.uint8)
+        for text, (x, y), scale in stat_lines:
+            pos = (x - left, y - top)
+            draw_text_with_outline(panel, text, pos, scale=scale)
+            # Mirror both strokes of draw_text_with_outline
+            cv2.putText(transmission, text, pos, UI_FONT, scale, 0, 2, cv2.LINE_AA)
+            cv2.putText(transmission, text, pos, UI_FONT, scale, 0, 1, cv2.LINE_AA)
+
+        frame_weights = (1 - background_alpha) * (transmission.astype(np.float32) / 255)
+        panel_weights = 1 - frame_weights
+        # blendLinear expects straight colours, while the panel was rendered premultiplied.
+        # Pixels with no panel weight are left black; they only show the camera image.
+        straight = np.divide(panel, panel_weights[..., None], out=np.zeros(panel.shape, dtype=np.float32),
+                             where=panel_weights[..., None] > 0)
+        self._cached_panel = np.clip(np.rint(straight), 0, 255).astype(np.uint8)
+        self._panel_weights = panel_weights
+        self._frame_weights = frame_weights
+
+    def draw(self, frame):
+        """Blends the cached panel onto the frame in place."""
+        left, top = self.panel_origin
+        region = frame[top:top + self._cached_panel.shape[0], left:left + self._cached_panel.shape[1]]
+        # The frame may be smaller than the panel if the camera ignored the requested size
+        height, width = region.shape[:2]
+        cv2.blendLinear(self._cached_panel[:height, :width], region,
+                        self._panel_weights[:height, :width], self._frame_weights[:height, :width], dst=region)
+        return frame
 
-# --- Worker Thread ---
+# --- Shared State ---
 
-def audio_worker(q, stop_event):
+@dataclass(slots=True)
+class SharedStats:
+    """
+    The latest analysis stats, shared between the audio and main threads.
+    Stats are overwritten in place instead of being queued, so the main
+    thread always reads the newest values and nothing piles up.
+    """
+    data: dict = field(default_factory=dict)
+    version: int = 0 # Incremented whenever the stats change
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def update(self, data):
+        """Replaces the stats, bumping the version only if they changed."""
+        with self.lock:
+            if data != self.data:
+                self.data = data
+                self.version += 1
+
+    def snapshot(self):
+        """Returns the current (version, stats) pair."""
+        with self.lock:
+            return self.version, self.data
+
+# --- Audio Buffering ---
+
+class AudioRingBuffer:
+    """
+    A fixed-size circular byte buffer that hands raw PCM from the capture
+    thread to the recognizer. The ring storage is allocated once up front,
+    and a slow recognizer can fall behind without the microphone stream
+    overflowing.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        # Absolute byte positions; the buffer index is the position modulo capacity
+        self.write_pos = 0
+        self.read_pos = 0
+        self.lock = threading.Lock()
+        self.data_available = threading.Event()
+
+    def write(self, data):
+        """Appends a chunk of audio, overwriting the oldest unread audio if full."""
+        data = memoryview(data)[-self.capacity:]
+        with self.lock:
+            start = self.write_pos % self.capacity
+            first = min(len(data), self.capacity - start)
+            self.view[start:start + first] = data[:first]
+            self.view[:len(data) - first] = data[first:]
+            self.write_pos += len(data)
+
+            # If the reader fell a whole buffer behind, skip the lost audio
+            if self.write_pos - self.read_pos > self.capacity:
+                self.read_pos = self.write_pos - self.capacity
+            self.data_available.set()
+
+    def read(self, timeout):
+        """
+        Returns the oldest unread contiguous span of audio as bytes, or an
+        empty bytes object if nothing arrived within `timeout` seconds.
+        """
+        if not self.data_available.wait(timeout):
+            return b""
+        with self.lock:
+            start = self.read_pos % self.capacity
+            end = start + min(self.write_pos - self.read_pos, self.capacity - start)
+            data = bytes(self.view[start:end])
+            self.read_pos += end - start
+            if self.read_pos == self.write_pos:
+                self.data_available.clear()
+        return data
+
+# --- Worker Threads ---
+
+def capture_worker(q, stream, audio_buffer, stop_event):
+    """
+    Drains the microphone stream into the ring buffer. Kept separate from
+    recognition so slow AcceptWaveform calls never delay reading the stream.
+    """
+    try:
+        while not stop_event.is_set():
+            audio_buffer.write(stream.read(CHUNK_SIZE, exception_on_overflow=False))
+    except Exception as e:
+        # Report any fatal error to the main thread
+        import traceback
+        error_msg = f"Error in capture thread: {e}\n{traceback.format_exc()}"
+        q.put({'type': 'error', 'message': error_msg})
+
+def audio_worker(q, stop_event, shared_stats):
     """
     The heart of the application. Runs in a separate thread to handle all
     audio processing and speech analysis, preventing the UI from freezing.
@@ -77,35 +232,51 @@ def audio_worker(q, stop_event):
         stream = p.open(format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE,
                         input=True, frames_per_buffer=CHUNK_SIZE)
         stream.start_stream()
+
+        # Capture runs in its own thread, stopped separately so it always
+        # finishes before the stream is closed below.
+        audio_buffer = AudioRingBuffer(AUDIO_BUFFER_SIZE)
+        capture_stop_event = threading.Event()
+        capture_thread = threading.Thread(target=capture_worker,
+                                          args=(q, stream, audio_buffer, capture_stop_event))
+        capture_thread.start()
         
         print("[Audio Thread] Ready and listening.")
         q.put({'type': 'status', 'message': 'Ready'})
         
         last_stats_update = 0
+        last_partial_raw = None
 
         # --- Main Loop ---
         while not stop_event.is_set():
-            data = stream.read(4096, exception_on_overflow=False)
+            data = audio_buffer.read(AUDIO_READ_TIMEOUT)
             
-            # Feed audio to the recognizer
-            if recognizer.AcceptWaveform(data):
-                res = json.loads(recognizer.Result())
-                if res.get('text'):
-                    final_words = res.get('result', [])
-                    analyzer.process_final_result(final_words)
-                    q.put({"type": "final", "words": final_words})
-            else:
-                partial_res = json.loads(recognizer.PartialResult())
-                partial_text = partial_res.get('partial', '')
-                if partial_text:
-                    analyzer.process_partial_result(partial_text)
-                    q.put({"type": "partial", "text": partial_text})
-
-            # Periodically send a full analysis update to the main thread
+            if data:
+                # Feed audio to the recognizer
+                if recognizer.AcceptWaveform(data):
+                    res = orjson.loads(recognizer.Result())
+                    last_partial_raw = None # The next utterance starts a fresh partial
+                    if res.get('text'):
+                        final_words = res.get('result', [])
+                        analyzer.process_final_result(final_words)
+                        q.put({"type": "final", "words": final_words})
+                else:
+                    # Vosk often repeats the same partial across chunks, so skip
+                    # parsing and re-sending it unless the raw result changed.
+                    partial_raw = recognizer.PartialResult()
+                    if partial_raw != last_partial_raw:
+                        last_partial_raw = partial_raw
+                        partial_res = orjson.loads(partial_raw)
+                        partial_text = partial_res.get('partial', '')
+                        if partial_text:
+                            analyzer.process_partial_result(partial_text)
+                            q.put({"type": "partial", "text": partial_text})
+
+            # Periodically publish a full analysis update for the main thread
             current_time = time.time()
             if current_time - last_stats_update > 0.25: # 4 updates per second
                 stats = analyzer.get_analysis(current_time)
-                q.put({"type": "stats", "data": stats})
+                shared_stats.update(stats)
                 last_stats_update = current_time
 
     except Exception as e:
@@ -116,6 +287,9 @@ def audio_worker(q, stop_event):
     finally:
         # --- Cleanup ---
         print("[Audio Thread] Cleaning up...")
+        if 'capture_thread' in locals():
+            capture_stop_event.set()
+            capture_thread.join()
         if 'stream' in locals() and stream.is_active():
             stream.stop_stream()
             stream.close()
@@ -138,41 +312,57 @@ def main():
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, WINDOW_WIDTH)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, WINDOW_HEIGHT)
 
-    q = queue.Queue()
+    q = queue.Queue() # Transcript and status events
+    shared_stats = SharedStats() # Latest stats, overwritten rather than queued
     stop_event = threading.Event()
     
     print("[Main Thread] Starting audio worker...")
-    audio_thread = threading.Thread(target=audio_worker, args=(q, stop_event))
+    audio_thread = threading.Thread(target=audio_worker, args=(q, stop_event, shared_stats))
     audio_thread.start()
 
     # --- Application State ---
     final_transcript_words = []
     partial_transcript = ""
-    current_stats = {}
+    stats_version = 0
+    ui_renderer = UIRenderer()
     status_message = "Initializing..."
+    caption_lines = []
+    captions_dirty = False
 
     # --- Main Loop ---
     try:
         while True:
-            # Check for messages from the audio thread
-            try:
-                msg = q.get_nowait()
-                if msg['type'] == 'stats':
-                    current_stats = msg['data']
-                elif msg['type'] == 'partial':
+            # Drain all pending messages from the audio thread each frame so
+            # they never pile up; only the latest partial text matters
+            fatal_error = False
+            while True:
+                try:
+                    msg = q.get_nowait()
+                except queue.Empty:
+                    break # No more messages
+                if msg['type'] == 'partial':
                     partial_transcript = msg['text']
+                    captions_dirty = True
                 elif msg['type'] == 'final':
                     # Filter words by the same confidence threshold before adding to the transcript
                     confident_words = [word for word in msg['words'] if word.get('conf', 0) >= CONFIDENCE_THRESHOLD]
                     final_transcript_words.extend(confident_words)
                     partial_transcript = "" # Clear partial text on final result
+                    captions_dirty = True
                 elif msg['type'] == 'status':
                     status_message = msg['message']
                 elif msg['type'] == 'error':
                     print(f"FATAL ERROR from audio thread: {msg['message']}")
+                    fatal_error = True
                     break
-            except queue.Empty:
-                pass # No new messages
+            if fatal_error:
+                break
+
+            # Re-render the stats panel only when the audio thread changed the stats
+            latest_version, latest_stats = shared_stats.snapshot()
+            if latest_version != stats_version:
+                stats_version = latest_version
+                ui_renderer.update_stats(latest_stats)
 
             # Read frame from camera
             ret, frame = cap.read()
@@ -180,28 +370,31 @@ def main():
                 print("Error: Can't receive frame from camera. Exiting...")
                 break
             
-            frame = cv2.flip(frame, 1) # Flip horizontally for a mirror effect
+            cv2.flip(frame, 1, dst=frame) # Flip horizontally in place for a mirror effect
 
-            # Draw the UI
-            frame = draw_ui(frame, current_stats)
+            # Draw the UI from the panel cached at the last stats change
+            frame = ui_renderer.draw(frame)
 
             # --- Draw Captions ---
-            # Limit transcript history to avoid filling the screen
-            MAX_WORDS_ON_SCREEN = 20
-            display_words = final_transcript_words[-MAX_WORDS_ON_SCREEN:]
-            
-            full_text = " ".join([w.get('word', '') for w in display_words])
-            if partial_transcript:
-                # Add an ellipsis to show it's a live transcript
-                full_text += " " + partial_transcript + "..."
+            # Only rebuild the caption text when the transcript has changed
+            if captions_dirty:
+                # Limit transcript history to avoid filling the screen
+                MAX_WORDS_ON_SCREEN = 20
+                display_words = final_transcript_words[-MAX_WORDS_ON_SCREEN:]
+                
+                full_text = " ".join([w.get('word', '') for w in display_words])
+                if partial_transcript:
+                    # Add an ellipsis to show it's a live transcript
+                    full_text += " " + partial_transcript + "..."
 
-            # Wrap text to fit the window width
-            wrapped_text = textwrap.wrap(full_text, width=60) # Adjust width as needed
+                # Wrap text to fit the window width, keeping the last 2 lines
+                caption_lines = textwrap.wrap(full_text, width=60)[-2:] # Adjust width as needed
+                captions_dirty = False
             
             # Display the last 2 lines of captions
             caption_y_start = WINDOW_HEIGHT - 80
             line_height = 35
-            for i, line in enumerate(wrapped_text[-2:]):
+            for i, line in enumerate(caption_lines):
                 y_pos = caption_y_start + (i * line_height)
                 # Use the corrected helper function to draw captions
                 draw_text_with_outline(frame, line.strip(), (20, y_pos), scale=0.9)